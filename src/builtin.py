@@ -1,4 +1,10 @@
+import operator
+from fractions import Fraction
+
 import expr
+import limits
+import printer
+from scheduler import Scheduler, Channel
 
 ## Core Interpreter
 
@@ -11,6 +17,9 @@ def lisp_builtin(*names):
         return exec_func
     return decorator
 
+def number(value):
+    return expr.NumericLiteral.create_numeric_literal(value)
+
 @lisp_builtin('+')
 def __add_exec(args, env):
     """Add the arguments.
@@ -23,15 +32,17 @@ def __add_exec(args, env):
     >>> builtin.bind_builtins(Environment.GLOBAL)
     >>> parse_tokens(lexer('(+ 2 3)'))[0].eval(Environment.GLOBAL)
     IntegerLiteral(5)
+    >>> parse_tokens(lexer('(+ 1/3 2/3 1.5)'))[0].eval(Environment.GLOBAL)
+    FloatLiteral(2.5)
     """
-    res = sum(arg.host_value for arg in args)
-    return expr.NumericLiteral.create_numeric_literal(res)
+    return number(sum(arg.host_value for arg in args))
 
 @lisp_builtin('-')
 def __sub_exec(args, env):
     """Subtract the rest of the argument arguments from the first argument.
 
-    Arguemts must be of numeric type.
+    With a single argument, return its negation. Arguemts must be of numeric
+    type.
 
     >>> import builtin
     >>> from parser import lexer, parse_tokens
@@ -39,12 +50,15 @@ def __sub_exec(args, env):
     >>> builtin.bind_builtins(Environment.GLOBAL)
     >>> parse_tokens(lexer('(- 5 3)'))[0].eval(Environment.GLOBAL)
     IntegerLiteral(2)
+    >>> parse_tokens(lexer('(- 5)'))[0].eval(Environment.GLOBAL)
+    IntegerLiteral(-5)
     """
-    res = args[0].host_value + sum(-arg.host_value for arg in args[1:])
-    return expr.NumericLiteral.create_numeric_literal(res)
+    if len(args) == 1:
+        return number(-args[0].host_value)
+    return number(args[0].host_value - sum(arg.host_value for arg in args[1:]))
 
 @lisp_builtin('*')
-def __sub_exec(args, env):
+def __mul_exec(args, env):
     """Multiply the arguments.
 
     Arguemts must be of numeric type.
@@ -56,16 +70,42 @@ def __sub_exec(args, env):
     >>> parse_tokens(lexer('(* 5 3 2)'))[0].eval(Environment.GLOBAL)
     IntegerLiteral(30)
     """
-    from functools import reduce
-    from operator import mul
-    res = reduce(mul, [arg.host_value for arg in args])
-    return expr.NumericLiteral.create_numeric_literal(res)
+    res = 1
+    for arg in args:
+        res *= arg.host_value
+    return number(res)
+
+def divide(*values):
+    """Divide the first of `values` by the rest, exactly unless one of them is
+    a float. With a single value, return its reciprocal.
+
+    >>> divide(10 ** 30 + 2, 2)
+    500000000000000000000000000001
+    >>> divide(1, 3, 2)
+    Fraction(1, 6)
+    >>> divide(4)
+    Fraction(1, 4)
+    """
+    if len(values) == 1:
+        values = (1,) + values
+    res = values[0]
+    for value in values[1:]:
+        if type(res) is int and type(value) is int:
+            if value == 0:
+                raise ZeroDivisionError('division by zero')
+            if res % value == 0:
+                res //= value
+            else:
+                res = Fraction(res, value)
+        else:
+            res = res / value
+    return res
 
 @lisp_builtin('/')
-def __sub_exec(args, env):
+def __div_exec(args, env):
     """Divide the first argument by the rest of the arguments.
 
-    Arguemts must be of numeric type.
+    Division of exact numbers is exact. Arguemts must be of numeric type.
 
     >>> import builtin
     >>> from parser import lexer, parse_tokens
@@ -73,21 +113,164 @@ def __sub_exec(args, env):
     >>> builtin.bind_builtins(Environment.GLOBAL)
     >>> parse_tokens(lexer('(/ 18 3 2)'))[0].eval(Environment.GLOBAL)
     IntegerLiteral(3)
+    >>> parse_tokens(lexer('(/ 1 3)'))[0].eval(Environment.GLOBAL).repr()
+    '1/3'
+    >>> parse_tokens(lexer('(/ 3 2.0)'))[0].eval(Environment.GLOBAL)
+    FloatLiteral(1.5)
     """
-    from functools import reduce
-    from operator import truediv
-    res = reduce(truediv, [arg.host_value for arg in args])
-    return expr.NumericLiteral.create_numeric_literal(res)
+    return number(divide(*[arg.host_value for arg in args]))
+
+def compare(op, args):
+    values = [arg.host_value for arg in args]
+    for a, b in zip(values, values[1:]):
+        if not op(a, b):
+            return expr.BooleanLiteral('#f')
+    return expr.BooleanLiteral('#t')
 
 @lisp_builtin('=')
 def __equalsign_exec(args, env):
-    a, b = [arg.host_value for arg in args]
-    return expr.BooleanLiteral('#t' if a == b else '#f')
+    """Return whether all the arguments are numerically equal.
+
+    >>> import builtin
+    >>> from parser import lexer, parse_tokens
+    >>> from environment import Environment
+    >>> builtin.bind_builtins(Environment.GLOBAL)
+    >>> parse_tokens(lexer('(= 1/2 0.5 2/4)'))[0].eval(Environment.GLOBAL)
+    BooleanLiteral('#t')
+    """
+    return compare(operator.eq, args)
 
 @lisp_builtin('<')
 def __lt_exec(args, env):
+    """Return whether the arguments are strictly increasing.
+
+    >>> import builtin
+    >>> from parser import lexer, parse_tokens
+    >>> from environment import Environment
+    >>> builtin.bind_builtins(Environment.GLOBAL)
+    >>> parse_tokens(lexer('(< 1 3/2 2)'))[0].eval(Environment.GLOBAL)
+    BooleanLiteral('#t')
+    >>> parse_tokens(lexer('(< 1 3 2)'))[0].eval(Environment.GLOBAL)
+    BooleanLiteral('#f')
+    """
+    return compare(operator.lt, args)
+
+@lisp_builtin('>')
+def __gt_exec(args, env):
+    """Return whether the arguments are strictly decreasing."""
+    return compare(operator.gt, args)
+
+@lisp_builtin('<=')
+def __le_exec(args, env):
+    """Return whether the arguments are non-decreasing."""
+    return compare(operator.le, args)
+
+@lisp_builtin('>=')
+def __ge_exec(args, env):
+    """Return whether the arguments are non-increasing."""
+    return compare(operator.ge, args)
+
+def quotient(a, b):
+    """Return a / b truncated towards zero."""
+    res = a // b
+    if res < 0 and res * b != a:
+        res += 1
+    return res
+
+@lisp_builtin('quotient')
+def __quotient_exec(args, env):
+    """Divide two integers, truncating towards zero.
+
+    >>> import builtin
+    >>> from parser import lexer, parse_tokens
+    >>> from environment import Environment
+    >>> builtin.bind_builtins(Environment.GLOBAL)
+    >>> parse_tokens(lexer('(quotient -7 2)'))[0].eval(Environment.GLOBAL)
+    IntegerLiteral(-3)
+    """
+    a, b = [arg.host_value for arg in args]
+    return number(quotient(a, b))
+
+@lisp_builtin('remainder')
+def __remainder_exec(args, env):
+    """Return the remainder of `quotient`, which has the sign of the dividend.
+
+    >>> import builtin
+    >>> from parser import lexer, parse_tokens
+    >>> from environment import Environment
+    >>> builtin.bind_builtins(Environment.GLOBAL)
+    >>> parse_tokens(lexer('(remainder -7 2)'))[0].eval(Environment.GLOBAL)
+    IntegerLiteral(-1)
+    """
+    a, b = [arg.host_value for arg in args]
+    return number(a - b * quotient(a, b))
+
+@lisp_builtin('modulo')
+def __modulo_exec(args, env):
+    """Return the modulo of two integers, which has the sign of the divisor.
+
+    >>> import builtin
+    >>> from parser import lexer, parse_tokens
+    >>> from environment import Environment
+    >>> builtin.bind_builtins(Environment.GLOBAL)
+    >>> parse_tokens(lexer('(modulo -7 2)'))[0].eval(Environment.GLOBAL)
+    IntegerLiteral(1)
+    """
     a, b = [arg.host_value for arg in args]
-    return expr.BooleanLiteral('#t' if a < b else '#f')
+    return number(a % b)
+
+@lisp_builtin('expt')
+def __expt_exec(args, env):
+    """Raise the first argument to the power of the second.
+
+    The result is exact when the base is exact and the exponent an integer.
+
+    >>> import builtin
+    >>> from parser import lexer, parse_tokens
+    >>> from environment import Environment
+    >>> builtin.bind_builtins(Environment.GLOBAL)
+    >>> parse_tokens(lexer('(expt 2 100)'))[0].eval(Environment.GLOBAL)
+    IntegerLiteral(1267650600228229401496703205376)
+    >>> parse_tokens(lexer('(expt 2/3 -2)'))[0].eval(Environment.GLOBAL).repr()
+    '9/4'
+    >>> parse_tokens(lexer('(expt 4 0.5)'))[0].eval(Environment.GLOBAL)
+    FloatLiteral(2.0)
+    """
+    base, exponent = [arg.host_value for arg in args]
+    if type(exponent) is int and not isinstance(base, float):
+        if exponent < 0:
+            base = Fraction(base)
+        return number(base ** exponent)
+    res = base ** exponent
+    if isinstance(res, complex):
+        raise ValueError('expt result is not a real number')
+    return number(float(res))
+
+@lisp_builtin('exact->inexact')
+def __exact_to_inexact_exec(args, env):
+    """Convert a number to a float.
+
+    >>> import builtin
+    >>> from parser import lexer, parse_tokens
+    >>> from environment import Environment
+    >>> builtin.bind_builtins(Environment.GLOBAL)
+    >>> parse_tokens(lexer('(exact->inexact 1/4)'))[0].eval(Environment.GLOBAL)
+    FloatLiteral(0.25)
+    """
+    return expr.FloatLiteral(float(args[0].host_value))
+
+@lisp_builtin('inexact->exact')
+def __inexact_to_exact_exec(args, env):
+    """Convert a number to the exact number with the same value.
+
+    >>> import builtin
+    >>> from parser import lexer, parse_tokens
+    >>> from environment import Environment
+    >>> builtin.bind_builtins(Environment.GLOBAL)
+    >>> parse_tokens(lexer('(inexact->exact 0.5)'))[0].eval(Environment.GLOBAL).repr()
+    '1/2'
+    """
+    return number(Fraction(args[0].host_value))
 
 @lisp_builtin('apply')
 def __apply_exec(args, env):
@@ -100,8 +283,7 @@ def __apply_exec(args, env):
     >>> parse_tokens(lexer("(apply + '(1 2 3 4))"))[0].eval(Environment.GLOBAL)
     IntegerLiteral(10)
     """
-    call_subexps = [args[0]] + args[1].subexprs
-    return expr.CallExpr(call_subexps).eval(env)
+    return call_procedure(args[0], args[1].subexprs, env)
 
 @lisp_builtin('display')
 def __display_exec(args, env):
@@ -125,7 +307,7 @@ def __display_exec(args, env):
     >>> parse_tokens(lexer("(display '(1 2))"))[0].eval(Environment.GLOBAL)
     (1 2)UndefinedExpr()
     """
-    print(args[0].repr(), end='')
+    printer.write_expr(args[0])
     return expr.UndefinedExpr()
 
 @lisp_builtin('eval')
@@ -140,6 +322,9 @@ def __eval_exec(args, env):
     >>> parse_tokens(lexer("(eval '(+ 1 2))"))[0].eval(Environment.GLOBAL)
     IntegerLiteral(3)
     """
+    # the expression may be evaluated within bindings its position in the
+    # source does not show
+    args[0].enter_scope(frozenset() if env.parent is None else None)
     return args[0].eval(env)
 
 @lisp_builtin('exit')
@@ -168,6 +353,408 @@ def __load_exec(args, env):
         expression.eval(env)
     return expr.UndefinedExpr()
 
+def call_procedure(procedure, args, env):
+    """Call the Scheme `procedure` on the already evaluated `args`."""
+    return expr.CallExpr.apply(procedure, args, env)
+
+## Lists
+
+def list_items(arg):
+    """Return the Python list of elements of the Scheme list `arg`."""
+    if type(arg) is not expr.CombinationExpr:
+        raise ValueError('expected a list, got ' + arg.repr())
+    return arg.subexprs
+
+FALSE = expr.BooleanLiteral('#f')
+
+def is_true(value):
+    return value != FALSE
+
+def is_equal(a, b):
+    """Return whether `a` and `b` are structurally equal Scheme values."""
+    if type(a) is expr.CombinationExpr and type(b) is expr.CombinationExpr:
+        return (len(a.subexprs) == len(b.subexprs)
+                and all(is_equal(x, y) for x, y in zip(a.subexprs, b.subexprs)))
+    if isinstance(a, expr.Name) and isinstance(b, expr.Name):
+        return a._str == b._str
+    if isinstance(a, expr.LiteralExpr) and isinstance(b, expr.LiteralExpr):
+        return (type(a) is type(b) and type(a) is not expr.UndefinedExpr
+                and a.host_value == b.host_value)
+    return a is b
+
+@lisp_builtin('list')
+def __list_exec(args, env):
+    """Return a list of the arguments.
+
+    >>> import builtin
+    >>> from parser import lexer, parse_tokens
+    >>> from environment import Environment
+    >>> builtin.bind_builtins(Environment.GLOBAL)
+    >>> parse_tokens(lexer("(list 1 'a (list 2))"))[0].eval(Environment.GLOBAL).repr()
+    '(1 a (2))'
+    """
+    return expr.CombinationExpr(list(args))
+
+@lisp_builtin('length')
+def __length_exec(args, env):
+    """Return the number of elements of a list.
+
+    >>> import builtin
+    >>> from parser import lexer, parse_tokens
+    >>> from environment import Environment
+    >>> builtin.bind_builtins(Environment.GLOBAL)
+    >>> parse_tokens(lexer("(length '(1 2 3))"))[0].eval(Environment.GLOBAL)
+    IntegerLiteral(3)
+    """
+    return expr.IntegerLiteral(len(list_items(args[0])))
+
+@lisp_builtin('append')
+def __append_exec(args, env):
+    """Concatenate the argument lists.
+
+    >>> import builtin
+    >>> from parser import lexer, parse_tokens
+    >>> from environment import Environment
+    >>> builtin.bind_builtins(Environment.GLOBAL)
+    >>> parse_tokens(lexer("(append '(1 2) '() '(3))"))[0].eval(Environment.GLOBAL).repr()
+    '(1 2 3)'
+    """
+    items = []
+    for arg in args:
+        items.extend(list_items(arg))
+    return expr.CombinationExpr(items)
+
+@lisp_builtin('reverse')
+def __reverse_exec(args, env):
+    """Return the elements of a list in reverse order.
+
+    >>> import builtin
+    >>> from parser import lexer, parse_tokens
+    >>> from environment import Environment
+    >>> builtin.bind_builtins(Environment.GLOBAL)
+    >>> parse_tokens(lexer("(reverse '(1 2 3))"))[0].eval(Environment.GLOBAL).repr()
+    '(3 2 1)'
+    """
+    return expr.CombinationExpr(list_items(args[0])[::-1])
+
+@lisp_builtin('list-ref')
+def __list_ref_exec(args, env):
+    """Return the element of a list at the given index.
+
+    >>> import builtin
+    >>> from parser import lexer, parse_tokens
+    >>> from environment import Environment
+    >>> builtin.bind_builtins(Environment.GLOBAL)
+    >>> parse_tokens(lexer("(list-ref '(a b c) 1)"))[0].eval(Environment.GLOBAL)
+    Name('b')
+    """
+    items, index = list_items(args[0]), args[1].host_value
+    if not 0 <= index < len(items):
+        raise IndexError('list index out of range: ' + str(index))
+    return items[index]
+
+@lisp_builtin('map')
+def __map_exec(args, env):
+    """Apply a procedure to the corresponding elements of the argument lists.
+
+    Stops at the end of the shortest list.
+
+    >>> import builtin
+    >>> from parser import lexer, parse_tokens
+    >>> from environment import Environment
+    >>> builtin.bind_builtins(Environment.GLOBAL)
+    >>> parse_tokens(lexer("(map (lambda (x) (* x x)) '(1 2 3))"))[0].eval(Environment.GLOBAL).repr()
+    '(1 4 9)'
+    >>> parse_tokens(lexer("(map + '(1 2 3) '(10 20))"))[0].eval(Environment.GLOBAL).repr()
+    '(11 22)'
+    """
+    procedure, lists = args[0], [list_items(arg) for arg in args[1:]]
+    apply = expr.CallExpr.apply
+    return expr.CombinationExpr([apply(procedure, list(elements), env)
+                                 for elements in zip(*lists)])
+
+@lisp_builtin('for-each')
+def __for_each_exec(args, env):
+    """Apply a procedure to the corresponding elements of the argument lists
+    for its side effects.
+
+    >>> import builtin
+    >>> from parser import lexer, parse_tokens
+    >>> from environment import Environment
+    >>> builtin.bind_builtins(Environment.GLOBAL)
+    >>> parse_tokens(lexer("(for-each display '(1 2 3))"))[0].eval(Environment.GLOBAL)
+    123UndefinedExpr()
+    """
+    procedure, lists = args[0], [list_items(arg) for arg in args[1:]]
+    apply = expr.CallExpr.apply
+    for elements in zip(*lists):
+        apply(procedure, list(elements), env)
+    return expr.UndefinedExpr()
+
+@lisp_builtin('filter')
+def __filter_exec(args, env):
+    """Return the elements of a list that satisfy a predicate.
+
+    >>> import builtin
+    >>> from parser import lexer, parse_tokens
+    >>> from environment import Environment
+    >>> builtin.bind_builtins(Environment.GLOBAL)
+    >>> parse_tokens(lexer("(filter (lambda (x) (< 1 x)) '(3 1 2 0))"))[0].eval(Environment.GLOBAL).repr()
+    '(3 2)'
+    """
+    procedure, apply = args[0], expr.CallExpr.apply
+    return expr.CombinationExpr([item for item in list_items(args[1])
+                                 if is_true(apply(procedure, [item], env))])
+
+@lisp_builtin('fold-left')
+def __fold_left_exec(args, env):
+    """Combine the elements of a list from the left, starting with an initial
+    value: (fold-left f init '(a b)) is (f (f init a) b).
+
+    >>> import builtin
+    >>> from parser import lexer, parse_tokens
+    >>> from environment import Environment
+    >>> builtin.bind_builtins(Environment.GLOBAL)
+    >>> parse_tokens(lexer("(fold-left cons '() '(1 2))"))[0].eval(Environment.GLOBAL).repr()
+    '((() 1) 2)'
+    """
+    procedure, result, apply = args[0], args[1], expr.CallExpr.apply
+    for item in list_items(args[2]):
+        result = apply(procedure, [result, item], env)
+    return result
+
+@lisp_builtin('fold-right')
+def __fold_right_exec(args, env):
+    """Combine the elements of a list from the right, starting with an
+    initial value: (fold-right f init '(a b)) is (f a (f b init)).
+
+    >>> import builtin
+    >>> from parser import lexer, parse_tokens
+    >>> from environment import Environment
+    >>> builtin.bind_builtins(Environment.GLOBAL)
+    >>> parse_tokens(lexer("(fold-right list '() '(1 2))"))[0].eval(Environment.GLOBAL).repr()
+    '(1 (2 ()))'
+    """
+    procedure, result, apply = args[0], args[1], expr.CallExpr.apply
+    for item in reversed(list_items(args[2])):
+        result = apply(procedure, [item, result], env)
+    return result
+
+@lisp_builtin('member')
+def __member_exec(args, env):
+    """Return the tail of a list starting at the first element equal to the
+    given value, or #f.
+
+    >>> import builtin
+    >>> from parser import lexer, parse_tokens
+    >>> from environment import Environment
+    >>> builtin.bind_builtins(Environment.GLOBAL)
+    >>> parse_tokens(lexer("(member '(b) '(a (b) c))"))[0].eval(Environment.GLOBAL).repr()
+    '((b) c)'
+    >>> parse_tokens(lexer("(member 'd '(a b c))"))[0].eval(Environment.GLOBAL)
+    BooleanLiteral('#f')
+    """
+    items = list_items(args[1])
+    for i, item in enumerate(items):
+        if is_equal(args[0], item):
+            return expr.CombinationExpr(items[i:])
+    return FALSE
+
+@lisp_builtin('assoc')
+def __assoc_exec(args, env):
+    """Return the first pair of an association list whose car is equal to the
+    given key, or #f.
+
+    >>> import builtin
+    >>> from parser import lexer, parse_tokens
+    >>> from environment import Environment
+    >>> builtin.bind_builtins(Environment.GLOBAL)
+    >>> parse_tokens(lexer("(assoc 'b '((a 1) (b 2)))"))[0].eval(Environment.GLOBAL).repr()
+    '(b 2)'
+    """
+    for pair in list_items(args[1]):
+        if list_items(pair) and is_equal(args[0], pair[0]):
+            return pair
+    return FALSE
+
+@lisp_builtin('sort')
+def __sort_exec(args, env):
+    """Return the elements of a list sorted by a less-than procedure.
+
+    The sort is stable.
+
+    >>> import builtin
+    >>> from parser import lexer, parse_tokens
+    >>> from environment import Environment
+    >>> builtin.bind_builtins(Environment.GLOBAL)
+    >>> parse_tokens(lexer("(sort '(3 1 2) <)"))[0].eval(Environment.GLOBAL).repr()
+    '(1 2 3)'
+    >>> parse_tokens(lexer(
+    ...     "(sort '((b 1) (a 0) (c 1)) (lambda (x y) (< (car (cdr x)) (car (cdr y)))))"
+    ... ))[0].eval(Environment.GLOBAL).repr()
+    '((a 0) (b 1) (c 1))'
+    """
+    from functools import cmp_to_key
+    less, apply = args[1], expr.CallExpr.apply
+    def compare(a, b):
+        # list.sort only ever asks whether one key is less than another
+        return -1 if is_true(apply(less, [a, b], env)) else 0
+    return expr.CombinationExpr(sorted(list_items(args[0]), key=cmp_to_key(compare)))
+
+## Concurrency
+
+@lisp_builtin('spawn')
+def __spawn_exec(args, env):
+    """Start a task that calls the given procedure on the rest of the arguments.
+
+    >>> import builtin
+    >>> from parser import lexer, parse_tokens
+    >>> from environment import Environment
+    >>> builtin.bind_builtins(Environment.GLOBAL)
+    >>> run = lambda s: parse_tokens(lexer(s))[0].eval(Environment.GLOBAL)
+    >>> run('(define t (spawn + 1 2))')
+    Name('t')
+    >>> run('(join t)')
+    IntegerLiteral(3)
+    """
+    procedure, rest, meter = args[0], args[1:], limits.state.meter
+    def thunk():
+        # the task is metered by the meter that was active when it was spawned
+        with meter.attached():
+            return call_procedure(procedure, rest, env)
+    return expr.TaskExpr(Scheduler.GLOBAL.spawn(thunk))
+
+@lisp_builtin('join')
+def __join_exec(args, env):
+    """Wait for the given task to finish and return its value."""
+    return Scheduler.GLOBAL.join(args[0].host_value)
+
+@lisp_builtin('yield')
+def __yield_exec(args, env):
+    """Let the other tasks run before continuing."""
+    Scheduler.GLOBAL.yield_()
+    return expr.UndefinedExpr()
+
+@lisp_builtin('sleep')
+def __sleep_exec(args, env):
+    """Park the current task for the given number of seconds.
+
+    >>> import builtin
+    >>> from parser import lexer, parse_tokens
+    >>> from environment import Environment
+    >>> builtin.bind_builtins(Environment.GLOBAL)
+    >>> run = lambda s: parse_tokens(lexer(s))[0].eval(Environment.GLOBAL)
+    >>> run("(define (f x) (if (sleep x) (display x)))")
+    Name('f')
+    >>> run("(define slow (spawn f 0.02))")
+    Name('slow')
+    >>> run("(define fast (spawn f 0.01))")
+    Name('fast')
+    >>> run("(run-tasks)")
+    0.010.02UndefinedExpr()
+    """
+    Scheduler.GLOBAL.sleep(args[0].host_value)
+    return expr.UndefinedExpr()
+
+@lisp_builtin('run-tasks')
+def __run_tasks_exec(args, env):
+    """Wait until every spawned task has finished.
+
+    Called from a task, it waits for the other tasks.
+
+    >>> import builtin
+    >>> from parser import lexer, parse_tokens
+    >>> from environment import Environment
+    >>> builtin.bind_builtins(Environment.GLOBAL)
+    >>> run = lambda s: parse_tokens(lexer(s))[0].eval(Environment.GLOBAL)
+    >>> run('(define (w) (run-tasks))')
+    Name('w')
+    >>> run('(join (spawn w))')
+    UndefinedExpr()
+    """
+    Scheduler.GLOBAL.run()
+    return expr.UndefinedExpr()
+
+@lisp_builtin('make-channel')
+def __make_channel_exec(args, env):
+    """Create a channel for passing messages between tasks.
+
+    >>> import builtin
+    >>> from parser import lexer, parse_tokens
+    >>> from environment import Environment
+    >>> builtin.bind_builtins(Environment.GLOBAL)
+    >>> run = lambda s: parse_tokens(lexer(s))[0].eval(Environment.GLOBAL)
+    >>> run("(define ch (make-channel))")
+    Name('ch')
+    >>> run("(define (echo) (send ch (+ 1 (receive ch))))")
+    Name('echo')
+    >>> run("(define t (spawn echo))")
+    Name('t')
+    >>> run("(send ch 41)")
+    UndefinedExpr()
+    >>> run("(join t)")
+    UndefinedExpr()
+    >>> run("(receive ch)")
+    IntegerLiteral(42)
+    """
+    return expr.ChannelExpr(Channel(Scheduler.GLOBAL))
+
+@lisp_builtin('send')
+def __send_exec(args, env):
+    """Send a value on a channel without blocking."""
+    args[0].host_value.send(args[1])
+    return expr.UndefinedExpr()
+
+@lisp_builtin('receive')
+def __receive_exec(args, env):
+    """Receive a value from a channel, parking until one is available.
+
+    >>> import builtin
+    >>> from parser import lexer, parse_tokens
+    >>> from environment import Environment
+    >>> builtin.bind_builtins(Environment.GLOBAL)
+    >>> run = lambda s: parse_tokens(lexer(s))[0].eval(Environment.GLOBAL)
+    >>> run("(define empty (make-channel))")
+    Name('empty')
+    >>> run("(receive empty)")
+    Traceback (most recent call last):
+    ...
+    scheduler.DeadlockError: waiting for an event no task can cause
+    """
+    return args[0].host_value.receive()
+
+@lisp_builtin('read-line')
+def __read_line_exec(args, env):
+    """Read a line from standard input, parking only the calling task."""
+    import sys
+    line = Scheduler.GLOBAL.blocking(sys.stdin.readline)
+    return expr.StringLiteral('"' + line.rstrip('\n') + '"')
+
+@lisp_builtin('read-file')
+def __read_file_exec(args, env):
+    """Return the contents of the named file, parking only the calling task."""
+    def read(path):
+        with open(path) as source_file:
+            return source_file.read()
+    contents = Scheduler.GLOBAL.blocking(read, args[0].host_value)
+    return expr.StringLiteral('"' + contents + '"')
+
+## Heap Images
+
+@lisp_builtin('save-image')
+def __save_image_exec(args, env):
+    """Save the global environment to the named heap image file."""
+    import image
+    image.save_image(args[0].host_value)
+    return expr.UndefinedExpr()
+
+@lisp_builtin('load-image')
+def __load_image_exec(args, env):
+    """Restore the global environment from the named heap image file."""
+    import image
+    image.load_image(args[0].host_value)
+    return expr.UndefinedExpr()
+
 def bind_builtins(env):
     for procedure in BUILTINS:
         env.bind(procedure.default_name, procedure)
@@ -7,11 +7,14 @@ class Environment:
         """Create an environment.
 
         Attributes:
-          bindings -- a dictionary of str -> expr.LISPExpr
-          parent   -- another environment or None for the global environment
+          bindings   -- a dictionary of str -> expr.LISPExpr
+          parent     -- the enclosing environment; only the global environment
+                        has none
+          global_env -- the global environment at the root of the chain
         """
         self.bindings = bindings
         self.parent = parent
+        self.global_env = parent.global_env
 
     def bind(self, name: 'expr.Name', value: 'expr.LISPExpr'):
         if not isinstance(name, expr.Name):
@@ -21,4 +24,106 @@ class Environment:
     def __getitem__(self, name):
         return self.bindings[name._str]
 
-Environment.GLOBAL = Environment(None)
+    def lookup(self, name: str) -> 'expr.LISPExpr':
+        """Return the value bound to `name` here or in an ancestor.
+
+        Raises KeyError if `name` is unbound.
+        """
+        env = self
+        while env.parent is not None:
+            bindings = env.bindings
+            if name in bindings:
+                return bindings[name]
+            env = env.parent
+        return env.lookup(name)
+
+    def shadows(self, name: str) -> bool:
+        """Return whether `name` is bound here or in a non-global ancestor."""
+        env = self
+        while env.parent is not None:
+            if name in env.bindings:
+                return True
+            env = env.parent
+        return False
+
+    def global_cell(self, name: str) -> 'Cell':
+        """Return the global cell `name` resolves to from here, or None if a
+        local binding shadows it or it is unbound."""
+        if self.shadows(name):
+            return None
+        env = self
+        while env.parent is not None:
+            env = env.parent
+        return env.global_cell(name)
+
+
+class Cell:
+    """A mutable box holding the value of a global binding.
+
+    The version is incremented every time the binding is redefined, so that
+    code specialized on the value can cheaply tell whether it is stale.
+    `shadowed` is set once the name has been defined in a local environment
+    where the define was not visible to the lexical scope of the code around
+    it, so that code can no longer assume the name refers to this cell.
+    """
+    __slots__ = ('value', 'version', 'shadowed')
+
+    def __init__(self, value: 'expr.LISPExpr', shadowed=False):
+        self.value = value
+        self.version = 0
+        self.shadowed = shadowed
+
+    def set(self, value: 'expr.LISPExpr'):
+        self.value = value
+        self.version += 1
+
+
+class GlobalEnvironment(Environment):
+    """The global environment, which keeps its bindings in cells.
+
+    A cell is never removed or replaced once created, so callers may hold on
+    to it and read the current value of the binding from it.
+    """
+
+    def __init__(self):
+        self.cells = {}
+        self.shadowed_names = set()
+        self.parent = None
+        self.global_env = self
+
+    @property
+    def bindings(self):
+        return {name: cell.value for name, cell in self.cells.items()}
+
+    def bind(self, name: 'expr.Name', value: 'expr.LISPExpr'):
+        if not isinstance(name, expr.Name):
+            raise ValueError('cannot bind value to non-name.')
+        cell = self.cells.get(name._str)
+        if cell is None:
+            self.cells[name._str] = Cell(value,
+                                         name._str in self.shadowed_names)
+        else:
+            cell.set(value)
+
+    def shadow(self, name: str):
+        """Record that `name` was defined locally where no lexical scope
+        accounted for it."""
+        self.shadowed_names.add(name)
+        cell = self.cells.get(name)
+        if cell is not None:
+            cell.shadowed = True
+
+    def __getitem__(self, name):
+        return self.cells[name._str].value
+
+    def lookup(self, name: str) -> 'expr.LISPExpr':
+        return self.cells[name].value
+
+    def shadows(self, name: str) -> bool:
+        return False
+
+    def global_cell(self, name: str) -> Cell:
+        return self.cells.get(name)
+
+
+Environment.GLOBAL = GlobalEnvironment()
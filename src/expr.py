@@ -1,5 +1,9 @@
+from fractions import Fraction
 from typing import List, Callable
 import environment
+import printer
+import transpiler
+import limits
 
 class LISPExpr:
     """A LISP expression is a LISP list or a single symbol."""
@@ -12,6 +16,11 @@ class LISPExpr:
     def repr(self) -> str:
         raise NotImplementedError
 
+    def enter_scope(self, scope):
+        """Record the names that may be bound locally where this expression
+        is evaluated; only combinations keep track of them."""
+        pass
+
 
 class SymbolicExpr(LISPExpr):
     @staticmethod
@@ -31,6 +40,8 @@ class SymbolicExpr(LISPExpr):
         BooleanLiteral('#f')
         >>> SymbolicExpr.create_symbolic_expr('2.2')
         FloatLiteral(2.2)
+        >>> SymbolicExpr.create_symbolic_expr('-6/4')
+        RationalLiteral(Fraction(-3, 2))
         >>> SymbolicExpr.create_symbolic_expr('"hello world"')
         StringLiteral('hello world')
         >>> SymbolicExpr.create_symbolic_expr('test')
@@ -55,11 +66,9 @@ class Name(SymbolicExpr):
 
     def eval(self, env):
         try:
-            return env[self]
+            return env.lookup(self._str)
         except KeyError:
-            if env.parent is None:
-                raise NameError('Unbound name: ' + self._str)
-            return self.eval(env.parent)
+            raise NameError('Unbound name: ' + self._str)
 
     def repr(self) -> str:
         return self._str
@@ -144,11 +153,37 @@ class BooleanLiteral(LiteralExpr):
 
 class NumericLiteral(LiteralExpr):
     @staticmethod
-    def create_numeric_literal(token: str):
+    def create_numeric_literal(token):
+        """Factory for numeric literals from a token or a host number.
+
+        Exact numbers are normalized, so a rational with denominator 1 becomes
+        an integer.
+
+        >>> NumericLiteral.create_numeric_literal(Fraction(6, 3))
+        IntegerLiteral(2)
+        >>> NumericLiteral.create_numeric_literal(2.5)
+        FloatLiteral(2.5)
+        >>> NumericLiteral.create_numeric_literal('1/3').repr()
+        '1/3'
+        """
+        if type(token) is int:
+            return IntegerLiteral(token)
+        if isinstance(token, Fraction):
+            if token.denominator == 1:
+                return IntegerLiteral(token.numerator)
+            return RationalLiteral(token)
+        if isinstance(token, float):
+            return FloatLiteral(token)
         try:
             return IntegerLiteral(token)
         except ValueError:
-            return FloatLiteral(token)
+            if '/' not in token:
+                return FloatLiteral(token)
+        try:
+            value = Fraction(token)
+        except ZeroDivisionError:
+            raise ValueError('zero denominator in ' + token)
+        return NumericLiteral.create_numeric_literal(value)
 
 
 class IntegerLiteral(NumericLiteral):
@@ -161,6 +196,16 @@ class IntegerLiteral(NumericLiteral):
         self.host_value = int(construction_token)
 
 
+class RationalLiteral(NumericLiteral):
+    def __init__(self, construction_token):
+        """Create an exact rational literal from the given token.
+
+        pre-condition:
+            - construction_token is a valid rational literal token: n/d
+        """
+        self.host_value = Fraction(construction_token)
+
+
 class FloatLiteral(NumericLiteral):
     def __init__(self, construction_token):
         """Create a float literal from the given token.
@@ -171,15 +216,29 @@ class FloatLiteral(NumericLiteral):
         self.host_value = float(construction_token)
 
 
+NOT_SCOPED = object()
+
 class CombinationExpr(LISPExpr):
+    # caches that are rebuilt on demand and never pickled
+    transient_attrs = ('form',)
+    form = None
+    scope = NOT_SCOPED
+
     def __init__(self, subexprs: List[LISPExpr]):
         self.subexprs = subexprs
 
     def eval(self, env):
-        return self.sift().eval(env)
+        meter = limits.state.meter
+        meter.steps += 1
+        if meter.steps >= meter.next_check:
+            meter.check()
+        form = self.form
+        if form is None:
+            form = self.form = self.sift()
+        return form.eval(env)
 
     def repr(self):
-        return '(' + ' '.join(subexp.repr() for subexp in self.subexprs) + ')'
+        return printer.repr_expr(self)
 
     def sift(self):
         """Sift down a general combination expression to a subclass.
@@ -202,9 +261,34 @@ class CombinationExpr(LISPExpr):
                       'unquote-splicing': UnquoteSplicingExpr,
                       'define-macro': DefineMacroExpr}
         try:
-            return expr_class[self.subexprs[0]._str](self.subexprs)
+            form = expr_class[self.subexprs[0]._str](self.subexprs)
         except:
-            return CallExpr(self.subexprs)
+            form = CallExpr(self.subexprs)
+        if self.scope is NOT_SCOPED:
+            self.scope = None
+        form.scope = self.scope
+        form.enclose()
+        return form
+
+    def enter_scope(self, scope):
+        """Record that this combination may be evaluated where the names in
+        the frozenset `scope` are bound locally, or any names if it is None.
+
+        The scope of a combination is the union of the scopes it is entered
+        with. Widening it after the combination was sifted drops the sifted
+        form, which was specialized on the narrower scope.
+        """
+        current = self.scope
+        if current is NOT_SCOPED:
+            self.scope = scope
+        elif current is not None and (scope is None or not scope <= current):
+            self.scope = None if scope is None else current | scope
+            self.form = None
+
+    def enclose(self):
+        """Enter the subexpressions of this sifted form into its scope."""
+        for subexpr in self.subexprs:
+            subexpr.enter_scope(self.scope)
 
     def __repr__(self):
         return '{}({})'.format(self.__class__.__name__, repr(self.subexprs))
@@ -215,53 +299,225 @@ class CombinationExpr(LISPExpr):
     def __len__(self):
         return len(self.subexprs)
 
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        for attr in self.transient_attrs:
+            state.pop(attr, None)
+        return state
+
 
 class CallExpr(CombinationExpr):
+    """A procedure call.
+
+    A call site whose operator is a name keeps an inline cache: the global
+    environment and cell the name resolved to, the procedure found in it and
+    the method that dispatches on that kind of procedure. Whether the name can
+    be shadowed is decided once, when the call is sifted: the operator is free
+    if its name is not in the scope of the call, i.e. not a formal parameter
+    or internal definition of an enclosing lambda. A call whose scope is
+    unknown is only cached while it is evaluated in the global environment
+    itself. While the cell still holds the same procedure, a call skips both
+    the lookup and the dispatch on the procedure type. Redefining the name
+    puts a new value in the cell, which invalidates the cache. A define that
+    binds the name in a local environment without appearing in the scope, as
+    one run by eval, load or a macro does, marks the cell shadowed, and calls
+    through it look the operator up again.
+
+    >>> import builtin
+    >>> from parser import lexer, parse_tokens
+    >>> from environment import GlobalEnvironment
+    >>> env = GlobalEnvironment()
+    >>> builtin.bind_builtins(env)
+    >>> run = lambda s: parse_tokens(lexer(s))[0].eval(env)
+    >>> call = parse_tokens(lexer('(f 2)'))[0]
+    >>> run('(define (f x) (* x 10))')
+    Name('f')
+    >>> call.eval(env)
+    IntegerLiteral(20)
+    >>> call.form.cached_operator is run('f')
+    True
+    >>> run('(define f -)')
+    Name('f')
+    >>> call.eval(env)
+    IntegerLiteral(-2)
+    >>> run('((lambda (f) (f 5)) (lambda (y) (+ y 1)))')
+    IntegerLiteral(6)
+    >>> run('(define (twice f x) (f (f x)))')
+    Name('twice')
+    >>> run('(twice (lambda (y) (* y 3)) 2)')
+    IntegerLiteral(18)
+    >>> body = run('twice').body
+    >>> body.form.head_free, body[1].form.head_free
+    (False, False)
+    >>> run('(define (g x) (f (car x)))')
+    Name('g')
+    >>> run("(g '(5))")
+    IntegerLiteral(-5)
+    >>> body = run('g').body
+    >>> body.form.head_free, body[1].form.head_free
+    (True, True)
+    >>> run("(define code '(car x))")
+    Name('code')
+    >>> run("(define first (eval (list 'lambda '(x) code)))")
+    Name('first')
+    >>> run("(first '(7 8))")
+    IntegerLiteral(7)
+    >>> run("((lambda (car x) (eval code)) cdr '(7 8))").repr()
+    '(8)'
+    >>> run("(define (greet) 'global)")
+    Name('greet')
+    >>> run("(define (by-eval) (car (cdr (cons (eval '(define greet (lambda () 'local))) (greet)))))")
+    Name('by-eval')
+    >>> run('(by-eval)')
+    Name('local')
+    >>> import os, tempfile
+    >>> lib = os.path.join(tempfile.mkdtemp(), 'lib')
+    >>> with open(lib + '.scm', 'w') as lib_file:
+    ...     _ = lib_file.write("(define greet (lambda () 'fromlib))")
+    >>> run("(define (by-load) (car (cdr (cons (load '{}) (greet)))))".format(lib))
+    Name('by-load')
+    >>> run('(by-load)')
+    Name('fromlib')
+    >>> run("(define m (define-macro (m) (list 'define 'greet '(lambda () 'macro))))")
+    Name('m')
+    >>> run('(define (by-macro) (car (cdr (cons (m) (greet)))))')
+    Name('by-macro')
+    >>> run('(by-macro)')
+    Name('macro')
+    >>> run('(greet)')
+    Name('global')
+    """
+    transient_attrs = ('form', 'cached_global', 'cached_cell',
+                       'cached_operator', 'cached_dispatch')
+    head_name = None
+    head_free = False
+    cached_global = None
+    cached_cell = None
+    cached_operator = None
+    cached_dispatch = None
+
+    def enclose(self):
+        CombinationExpr.enclose(self)
+        head = self.subexprs[0]
+        if isinstance(head, Name):
+            self.head_name = head._str
+            self.head_free = (self.scope is not None
+                              and head._str not in self.scope)
+
     def eval(self, env):
-        self.operator = self[0].eval(env)
-        if not isinstance(self.operator, CallableExpr):
-            raise ValueError(type(self).__name__ + ' not callable')
+        if self.head_free:
+            global_env = env.global_env
+        elif env.parent is None and self.head_name is not None:
+            global_env = env
+        else:
+            return self.call_looked_up(env)
+        cell = self.cached_cell
+        if global_env is not self.cached_global:
+            cell = global_env.global_cell(self.head_name)
+            if cell is None:
+                return self.call_looked_up(env)
+            self.cached_global, self.cached_cell = global_env, cell
+        if cell.shadowed:
+            return self.call_looked_up(env)
+        operator = cell.value
+        if operator is self.cached_operator:
+            return self.cached_dispatch(self, operator, env)
+        dispatch = self.cached_dispatch = CallExpr.dispatch_for(operator)
+        self.cached_operator = operator
+        return dispatch(self, operator, env)
+
+    def call_looked_up(self, env):
+        """Call the operator found by looking it up through `env`."""
+        operator = self.subexprs[0].eval(env)
+        return CallExpr.dispatch_for(operator)(self, operator, env)
+
+    @staticmethod
+    def dispatch_for(operator):
+        """Return the method that calls `operator`."""
+        if not isinstance(operator, CallableExpr):
+            raise ValueError(type(operator).__name__ + ' not callable')
         ### XXX arity check to be implemented
-        # if len(self.operator.args) != len(self) - 1:
+        # if len(operator.args) != len(self) - 1:
         #    raise ValueError('mismatching arguments for ' + self[1]._str)
-        if isinstance(self.operator, LambdaExpr):
-            return self.lambda_eval(env)
-        elif isinstance(self.operator, MuExpr):
-            return self.mu_eval(env)
-        elif isinstance(self.operator, BuiltinProcedure):
-            return self.builtin_eval(env)
-        return self.macro_eval(env)
-
-    def bind_and_exec(self, parent_env, call_env) -> LISPExpr:
+        if isinstance(operator, LambdaExpr):
+            return CallExpr.lambda_eval
+        elif isinstance(operator, MuExpr):
+            return CallExpr.mu_eval
+        elif isinstance(operator, BuiltinProcedure):
+            return CallExpr.builtin_eval
+        return CallExpr.macro_eval
+
+    def bind_and_exec(self, operator, parent_env, call_env) -> LISPExpr:
         """Bind the formal parameters to their values and execute the body.
 
         parameters:
+            operator   -- the procedure being called.
             call_env   -- the environment in which the CallExpr was called.
             parent_env -- the parent environment of where the body will be
                           executed.
         """
+        return CallExpr.exec_body(operator, parent_env,
+                                  [actual.eval(call_env) for actual in self[1:]])
+
+    @staticmethod
+    def exec_body(operator, parent_env, values) -> LISPExpr:
+        """Bind the formal parameters to `values` and execute the body."""
         bindings =  {}
-        for formal, actual in zip(self.operator.args.subexprs, self[1:]):
-            bindings[formal._str] = actual.eval(call_env)
+        for formal, value in zip(operator.args.subexprs, values):
+            bindings[formal._str] = value
         exec_env = environment.Environment(parent_env, bindings)
-        return self.operator.body.eval(exec_env)
+        meter_state = limits.state
+        meter_state.enter_call()
+        try:
+            return operator.body.eval(exec_env)
+        finally:
+            meter_state.exit_call()
 
-    def lambda_eval(self, env):
-        return self.bind_and_exec(self.operator.closure, env)
+    def lambda_eval(self, operator, env):
+        return CallExpr.apply_lambda(
+            operator, [actual.eval(env) for actual in self[1:]])
 
-    def mu_eval(self, env):
-        return self.bind_and_exec(env, env)
+    @staticmethod
+    def apply_lambda(operator, values) -> LISPExpr:
+        """Call the lambda `operator` on the already evaluated `values`."""
+        operator.call_count += 1
+        # native code is not metered, so limited evaluations stay interpreted
+        if (operator.call_count >= transpiler.TIER_UP_THRESHOLD
+                and not limits.state.meter.limited):
+            result = transpiler.call_native(operator, values)
+            if result is not None:
+                return result
+        return CallExpr.exec_body(operator, operator.closure, values)
 
-    def macro_eval(self, env):
+    @staticmethod
+    def apply(operator, values, env) -> LISPExpr:
+        """Call the procedure `operator` on the already evaluated `values`.
+
+        parameters:
+            env -- the environment the call is made from.
+        """
+        if isinstance(operator, LambdaExpr):
+            return CallExpr.apply_lambda(operator, values)
+        elif isinstance(operator, MuExpr):
+            return CallExpr.exec_body(operator, env, values)
+        elif isinstance(operator, BuiltinProcedure):
+            return operator.execute(values, env)
+        raise ValueError(type(operator).__name__ + ' cannot be applied')
+
+    def mu_eval(self, operator, env):
+        return self.bind_and_exec(operator, env, env)
+
+    def macro_eval(self, operator, env):
         bindings =  {}
-        for formal, actual in zip(self.operator.args.subexprs, self[1:]):
+        for formal, actual in zip(operator.args.subexprs, self[1:]):
             bindings[formal._str] = actual
-        body_env = environment.Environment(self.operator.closure, bindings)
-        macro_body = self.body.eval(body_env)
+        body_env = environment.Environment(operator.closure, bindings)
+        macro_body = operator.body.eval(body_env)
+        macro_body.enter_scope(self.scope)
         return macro_body.eval(env)
 
-    def builtin_eval(self, env):
-        return self.operator.execute([arg.eval(env) for arg in self[1:]], env)
+    def builtin_eval(self, operator, env):
+        return operator.execute([arg.eval(env) for arg in self[1:]], env)
 
 
 class SpecialFormExpr(CombinationExpr):
@@ -274,6 +530,8 @@ class SpecialFormExpr(CombinationExpr):
 class DefineExpr(SpecialFormExpr):
     form_name = 'define'
     nargs = 3
+    transient_attrs = ('form', 'procedure')
+    procedure = None
 
     def eval(self, env):
         """Bind a name to the given value or procedure and return the name.
@@ -292,14 +550,26 @@ class DefineExpr(SpecialFormExpr):
         if isinstance(self[1], Name):
             name, val = self[1], self[2].eval(env)
         else:
-            try:
-                name = self[1][0]
-                args = CombinationExpr(self[1][1:])
-                val = LambdaExpr([Name('lambda'), args, self[2]]).eval(env)
-            except: raise SyntaxError('bad procedure definition')
+            procedure = self.procedure
+            if procedure is None:
+                try:
+                    args = CombinationExpr(self[1][1:])
+                    procedure = LambdaExpr([Name('lambda'), args, self[2]])
+                except: raise SyntaxError('bad procedure definition')
+                procedure.scope = self.scope
+                procedure.enclose()
+                self.procedure = procedure
+            name, val = self[1][0], procedure.eval(env)
         env.bind(name, val)
+        if env.parent is not None and (self.scope is None
+                                       or name._str not in self.scope):
+            env.global_env.shadow(name._str)
         return name
 
+    def enclose(self):
+        if isinstance(self[1], Name):
+            self[2].enter_scope(self.scope)
+
 
 class IfExpr(SpecialFormExpr):
     form_name = 'if'
@@ -345,28 +615,76 @@ class CallableExpr(SpecialFormExpr):
         SpecialFormExpr.__init__(self, subexprs)
         self.args, self.body = self[1], self[2]
 
+    bound = frozenset()
+
     def eval(self, env):
         return self
 
+    def enclose(self):
+        self.bound = bound_names(self.args, self.body)
+        if self.scope is not None:
+            self.body.enter_scope(self.scope | self.bound)
+
+    def close_over(self, env):
+        """Return a copy of this procedure whose closure is `env`."""
+        if self.scope is None:
+            # the enclosing scope is unknown until the environment is
+            # known: nothing is bound around a procedure created globally
+            self.body.enter_scope(self.bound if env.parent is None else None)
+        procedure = type(self)(self.subexprs)
+        procedure.closure = env
+        return procedure
+
+
+def bound_names(formals, body) -> frozenset:
+    """Return the names a procedure binds locally: its formal parameters and
+    every name defined anywhere in its body."""
+    if isinstance(formals, CombinationExpr):
+        formals = formals.subexprs
+    else:
+        formals = [formals]
+    names = {formal._str for formal in formals if isinstance(formal, Name)}
+    pending = [body]
+    while pending:
+        exp = pending.pop()
+        if type(exp) is not CombinationExpr or not exp.subexprs:
+            continue
+        head = exp.subexprs[0]
+        if isinstance(head, Name) and head._str == 'quote':
+            continue
+        if isinstance(head, Name) and head._str == 'define' and len(exp) > 1:
+            target = exp.subexprs[1]
+            if isinstance(target, CombinationExpr) and target.subexprs:
+                target = target.subexprs[0]
+            if isinstance(target, Name):
+                names.add(target._str)
+        pending.extend(exp.subexprs)
+    return frozenset(names)
+
 
 class LambdaExpr(CallableExpr):
     form_name = 'lambda'
+    transient_attrs = ('form', 'call_count', 'native')
+    call_count = 0
+    native = None
 
     def eval(self, env):
-        self.closure = env
-        return self
+        return self.close_over(env)
 
 
 class MuExpr(CallableExpr):
     form_name = 'mu'
 
+    def enclose(self):
+        # a mu body sees the bindings of whoever calls it
+        self.body.enter_scope(None)
+
 
 class DefineMacroExpr(CallableExpr):
     form_name = 'define-macro'
 
     def eval(self, env):
-        self.closure = env
-        return self
+        return self.close_over(env)
 
 
 class BuiltinProcedure(CallableExpr):
@@ -383,6 +701,46 @@ class BuiltinProcedure(CallableExpr):
     def __repr__(self):
         return 'BuiltinProcedure({})'.format(self.default_name._str)
 
+    def __reduce__(self):
+        """Pickle builtins by name; their host functions are looked up again
+        when unpickled."""
+        return lookup_builtin, (self.default_name._str,)
+
+
+def lookup_builtin(name: str) -> BuiltinProcedure:
+    import builtin
+    for procedure in builtin.BUILTINS:
+        if procedure.default_name._str == name:
+            return procedure
+    raise NameError('Unknown builtin: ' + name)
+
+class TaskExpr(LiteralExpr):
+    def __init__(self, task: 'scheduler.Task'):
+        self.host_value = task
+
+    def repr(self):
+        return '#[task]'
+
+    def __repr__(self):
+        return 'TaskExpr()'
+
+    def __reduce__(self):
+        raise ValueError('cannot save a task in a heap image')
+
+
+class ChannelExpr(LiteralExpr):
+    def __init__(self, channel: 'scheduler.Channel'):
+        self.host_value = channel
+
+    def repr(self):
+        return '#[channel]'
+
+    def __repr__(self):
+        return 'ChannelExpr()'
+
+    def __reduce__(self):
+        raise ValueError('cannot save a channel in a heap image')
+
 class QuoteExpr(SpecialFormExpr):
     form_name = 'quote'
     nargs = 2
@@ -397,6 +755,9 @@ class QuoteExpr(SpecialFormExpr):
         """
         return self[1]
 
+    def enclose(self):
+        pass
+
 
 class DelayExpr(SpecialFormExpr):
     pass
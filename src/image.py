@@ -0,0 +1,141 @@
+import io
+import os
+import pickle
+import stat
+import sys
+import tempfile
+import zlib
+from fractions import Fraction
+
+import expr
+from environment import Environment
+
+GLOBAL_ENV_ID = 'global'
+
+class ImagePickler(pickle.Pickler):
+    """Pickle environment bindings, referring to the global environment by
+    name so that restored closures are attached to the live one."""
+
+    def persistent_id(self, obj):
+        if obj is Environment.GLOBAL:
+            return GLOBAL_ENV_ID
+        return None
+
+
+class ImageUnpickler(pickle.Unpickler):
+    """Unpickle environment bindings.
+
+    Only the expression and environment classes and the few callables needed
+    to rebuild them may be loaded, so a crafted image cannot run arbitrary
+    code.
+    """
+    SAFE_MODULES = ('expr', 'environment')
+    SAFE_GLOBALS = {('expr', 'lookup_builtin'): expr.lookup_builtin,
+                    ('fractions', 'Fraction'): Fraction}
+
+    def find_class(self, module, name):
+        if (module, name) in self.SAFE_GLOBALS:
+            return self.SAFE_GLOBALS[module, name]
+        if module in self.SAFE_MODULES:
+            obj = getattr(sys.modules[module], name, None)
+            if isinstance(obj, type):
+                return obj
+        raise pickle.UnpicklingError(
+            'forbidden global in image: {}.{}'.format(module, name))
+
+    def persistent_load(self, pid):
+        if pid != GLOBAL_ENV_ID:
+            raise pickle.UnpicklingError('unknown persistent id: ' + repr(pid))
+        return Environment.GLOBAL
+
+
+class ImageFileWriter:
+    """A writable file-like object compressing everything written to it."""
+
+    def __init__(self, image_file, compressor):
+        self.image_file = image_file
+        self.compressor = compressor
+
+    def write(self, data):
+        self.image_file.write(self.compressor.compress(data))
+
+
+def save_image(path: str, env=Environment.GLOBAL):
+    """Save the bindings of `env` to the heap image file at `path`.
+
+    >>> import os, tempfile
+    >>> import builtin
+    >>> from parser import lexer, parse_tokens
+    >>> builtin.bind_builtins(Environment.GLOBAL)
+    >>> run = lambda s: parse_tokens(lexer(s))[0].eval(Environment.GLOBAL)
+    >>> run('(define (square x) (* x x))')
+    Name('square')
+    >>> run("(define data '(1 (2 3)))")
+    Name('data')
+    >>> path = os.path.join(tempfile.mkdtemp(), 'test.image')
+    >>> save_image(path)
+    >>> stat.S_IMODE(os.stat(path).st_mode) == image_mode(path + '.new')
+    True
+    >>> os.chmod(path, 0o640)
+    >>> save_image(path)
+    >>> oct(stat.S_IMODE(os.stat(path).st_mode))
+    '0o640'
+    >>> run('(define square 0)')
+    Name('square')
+    >>> load_image(path)
+    >>> run('(square 7)')
+    IntegerLiteral(49)
+    >>> run('data').repr()
+    '(1 (2 3))'
+    >>> run('square').closure is Environment.GLOBAL
+    True
+    >>> run('(define ch (make-channel))')
+    Name('ch')
+    >>> save_image(path)
+    Traceback (most recent call last):
+    ...
+    ValueError: cannot save a channel in a heap image
+    >>> run('(define ch 0)')
+    Name('ch')
+    >>> load_image(path)
+    >>> run('(square 7)')
+    IntegerLiteral(49)
+    >>> import pickle
+    >>> with open(path, 'wb') as image_file:
+    ...     _ = image_file.write(zlib.compress(pickle.dumps(os.system)))
+    >>> load_image(path)
+    Traceback (most recent call last):
+    ...
+    _pickle.UnpicklingError: forbidden global in image: posix.system
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as image_file:
+            compressor = zlib.compressobj()
+            data = ImageFileWriter(image_file, compressor)
+            ImagePickler(data, pickle.HIGHEST_PROTOCOL).dump(env.bindings)
+            image_file.write(compressor.flush())
+        os.chmod(temp_path, image_mode(path))
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+def image_mode(path: str) -> int:
+    """Return the permissions to save the image at `path` with: those of the
+    file being replaced, or the ones a newly created file gets."""
+    try:
+        return stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        umask = os.umask(0)
+        os.umask(umask)
+        return 0o666 & ~umask
+
+def load_image(path: str, env=Environment.GLOBAL):
+    """Restore the bindings saved in the heap image file at `path` into `env`."""
+    with open(path, 'rb') as image_file:
+        data = zlib.decompress(image_file.read())
+    for name, value in ImageUnpickler(io.BytesIO(data)).load().items():
+        env.bind(expr.Name(name), value)
+
@@ -1,18 +1,54 @@
 import builtin
 from parser import lexer, parse_tokens
 from environment import Environment
+import printer
+import image
+from limits import Meter
 import sys
 
 if __name__ == '__main__':
+    import argparse
+    arg_parser = argparse.ArgumentParser(description='A Scheme interpreter.')
+    arg_parser.add_argument('--image', help='start from a saved heap image')
+    arg_parser.add_argument('--max-steps', type=int,
+                            help='evaluation steps allowed per expression')
+    arg_parser.add_argument('--timeout', type=float,
+                            help='seconds allowed per expression')
+    arg_parser.add_argument('--max-depth', type=int,
+                            help='maximum procedure call depth')
+    arg_parser.add_argument('--max-memory', type=int,
+                            help='bytes of memory growth allowed per expression, as traced '
+                                 'by tracemalloc')
+    arg_parser.add_argument('--metrics', action='store_true',
+                            help='report evaluation metrics on stderr')
+    arg_parser.add_argument('--print-max-depth', type=int,
+                            help='nesting depth of printed lists')
+    arg_parser.add_argument('--print-max-length', type=int,
+                            help='number of elements printed per list')
+    cli_args = arg_parser.parse_args()
     sys.setrecursionlimit(1000000)
     builtin.bind_builtins(Environment.GLOBAL)
+    if cli_args.image is not None:
+        image.load_image(cli_args.image)
     try:
         while True:
             try:
                 for exp in parse_tokens(lexer(input('>'))):
-                    print(exp.eval(Environment.GLOBAL).repr())
-            except BaseException as e:
-                if isinstance(e, EOFError): raise e
+                    meter = Meter(cli_args.max_steps, cli_args.timeout,
+                                  cli_args.max_depth, cli_args.max_memory)
+                    try:
+                        with meter:
+                            value = exp.eval(Environment.GLOBAL)
+                    finally:
+                        if cli_args.metrics:
+                            print(meter.metrics(), file=sys.stderr)
+                    printer.write_expr(value, sys.stdout,
+                                       cli_args.print_max_depth,
+                                       cli_args.print_max_length)
+                    sys.stdout.write('\n')
+            except EOFError:
+                raise
+            except (Exception, KeyboardInterrupt) as e:
                 print(type(e).__name__ + ': ' + str(e))
     except EOFError:
         print('\nEnd of input stream reached.\nMoriturus te saluto.')
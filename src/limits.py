@@ -0,0 +1,225 @@
+import contextlib
+import threading
+import time
+import tracemalloc
+
+CHECK_INTERVAL = 1024
+
+class ResourceLimitError(RuntimeError):
+    """Raised when an evaluation exceeds one of its resource limits."""
+
+
+class StepLimitError(ResourceLimitError):
+    pass
+
+
+class TimeLimitError(ResourceLimitError):
+    pass
+
+
+class DepthLimitError(ResourceLimitError):
+    pass
+
+
+class MemoryLimitError(ResourceLimitError):
+    pass
+
+
+class Meter:
+    """Counts evaluation steps and procedure call depth and enforces limits.
+
+    The evaluator reports to the meter of the current thread, `state.meter`.
+    A meter is installed for the duration of a `with` block. Call depth is
+    tracked per thread, so tasks evaluating on other threads do not add to
+    each other's depth.
+
+    >>> import builtin
+    >>> from parser import lexer, parse_tokens
+    >>> from environment import GlobalEnvironment
+    >>> env = GlobalEnvironment()
+    >>> builtin.bind_builtins(env)
+    >>> run = lambda s: parse_tokens(lexer(s))[0].eval(env)
+    >>> run('(define (loop n) (loop (+ n 1)))')
+    Name('loop')
+    >>> with Meter(max_steps=100) as meter:
+    ...     run('(loop 0)')
+    Traceback (most recent call last):
+    ...
+    limits.StepLimitError: exceeded 100 evaluation steps
+    >>> run('(define (down n) (if (= n 0) 0 (+ 1 (down (- n 1)))))')
+    Name('down')
+    >>> with Meter(max_depth=50) as meter:
+    ...     run('(down 40)')
+    IntegerLiteral(40)
+    >>> meter.peak_depth
+    41
+    >>> with Meter(max_depth=50):
+    ...     run('(down 60)')
+    Traceback (most recent call last):
+    ...
+    limits.DepthLimitError: exceeded maximum recursion depth of 50
+    >>> run('(define (nest n) (if (= n 0) (sleep 0.01) (car (list (nest (- n 1))))))')
+    Name('nest')
+    >>> with Meter(max_depth=30) as meter:
+    ...     run('(define a (spawn nest 20))')
+    ...     run('(define b (spawn nest 20))')
+    ...     run('(join a)')
+    ...     run('(join b)')
+    Name('a')
+    Name('b')
+    UndefinedExpr()
+    UndefinedExpr()
+    >>> meter.peak_depth
+    21
+    >>> run('(define (fib n) (if (< n 2) n (+ (fib (- n 1)) (fib (- n 2)))))')
+    Name('fib')
+    >>> with Meter(timeout=0.05):
+    ...     run('(fib 40)')
+    Traceback (most recent call last):
+    ...
+    limits.TimeLimitError: exceeded time limit of 0.05 seconds
+    >>> with Meter(timeout=0.05):
+    ...     run('(sleep 3)')
+    Traceback (most recent call last):
+    ...
+    limits.TimeLimitError: exceeded time limit of 0.05 seconds
+    >>> with Meter(max_memory=10 ** 6):
+    ...     run('(fib 15)')
+    IntegerLiteral(610)
+    >>> with Meter(max_memory=10 ** 5):
+    ...     run('(car (list (expt 7 1000000) (fib 15)))')
+    Traceback (most recent call last):
+    ...
+    limits.MemoryLimitError: exceeded memory limit of 100000 bytes
+    """
+
+    def __init__(self, max_steps=None, timeout=None, max_depth=None,
+                 max_memory=None):
+        """Create a meter.
+
+        Limits (None means unlimited):
+          max_steps  -- number of evaluated combinations
+          timeout    -- wall-clock seconds since the meter was entered
+          max_depth  -- nesting depth of procedure calls
+          max_memory -- growth in bytes of the memory currently allocated by
+                        Python, measured with tracemalloc while the meter is
+                        entered
+        """
+        self.max_steps = max_steps
+        self.timeout = timeout
+        self.max_depth = max_depth
+        self.max_memory = max_memory
+        self.limited = any(limit is not None for limit in
+                           (max_steps, timeout, max_depth, max_memory))
+        self.start()
+
+    def start(self):
+        """Reset the counters and start measuring."""
+        self.steps = 0
+        self.peak_depth = 0
+        self.start_time = time.monotonic()
+        self.start_memory = traced_memory()
+        self.next_check = CHECK_INTERVAL
+        if self.max_steps is not None:
+            self.next_check = min(self.next_check, self.max_steps + 1)
+
+    def check(self):
+        """Enforce the limits; called by the evaluator every so many steps."""
+        if self.max_steps is not None and self.steps > self.max_steps:
+            raise StepLimitError(
+                'exceeded {} evaluation steps'.format(self.max_steps))
+        if self.timeout is not None and self.elapsed() > self.timeout:
+            raise self.time_limit_error()
+        if self.max_memory is not None and self.memory() > self.max_memory:
+            raise MemoryLimitError(
+                'exceeded memory limit of {} bytes'.format(self.max_memory))
+        self.next_check = self.steps + CHECK_INTERVAL
+        if self.max_steps is not None:
+            self.next_check = min(self.next_check, self.max_steps + 1)
+
+    def reach_depth(self, depth):
+        """Record that a thread reached call `depth`, enforcing the limit."""
+        if self.max_depth is not None and depth > self.max_depth:
+            raise DepthLimitError(
+                'exceeded maximum recursion depth of {}'.format(self.max_depth))
+        if depth > self.peak_depth:
+            self.peak_depth = depth
+
+    def time_limit_error(self) -> TimeLimitError:
+        return TimeLimitError(
+            'exceeded time limit of {} seconds'.format(self.timeout))
+
+    def remaining_time(self):
+        """Return the seconds left before the timeout, or None if unlimited."""
+        if self.timeout is None:
+            return None
+        return max(0.0, self.timeout - self.elapsed())
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.start_time
+
+    def memory(self) -> int:
+        return traced_memory() - self.start_memory
+
+    def metrics(self) -> dict:
+        elapsed = self.elapsed()
+        return {'steps': self.steps,
+                'elapsed': elapsed,
+                'steps_per_second': self.steps / elapsed if elapsed else 0.0,
+                'peak_depth': self.peak_depth,
+                'memory': self.memory() if tracemalloc.is_tracing() else None}
+
+    @contextlib.contextmanager
+    def attached(self):
+        """Make this the meter of the current thread, starting at depth 0,
+        without resetting its counters."""
+        previous = state.meter, state.depth
+        state.meter, state.depth = self, 0
+        try:
+            yield self
+        finally:
+            state.meter, state.depth = previous
+
+    def __enter__(self):
+        # tracing slows allocation down, so it is only on while a memory
+        # limit is being enforced
+        self.started_tracing = (self.max_memory is not None
+                                and not tracemalloc.is_tracing())
+        if self.started_tracing:
+            tracemalloc.start()
+        self.start()
+        self._attachment = self.attached()
+        return self._attachment.__enter__()
+
+    def __exit__(self, *exc_info):
+        try:
+            return self._attachment.__exit__(*exc_info)
+        finally:
+            if self.started_tracing:
+                tracemalloc.stop()
+
+
+class MeterState(threading.local):
+    """The meter and procedure call depth of a thread."""
+    meter = None
+    depth = 0
+
+    def enter_call(self):
+        depth = self.depth + 1
+        if depth > self.meter.peak_depth:
+            self.meter.reach_depth(depth)
+        self.depth = depth
+
+    def exit_call(self):
+        self.depth -= 1
+
+
+def traced_memory() -> int:
+    """Return the bytes currently allocated by Python as seen by tracemalloc,
+    or 0 when it is not tracing."""
+    if not tracemalloc.is_tracing():
+        return 0
+    return tracemalloc.get_traced_memory()[0]
+
+MeterState.meter = Meter()
+state = MeterState()
@@ -0,0 +1,81 @@
+import sys
+
+import expr
+
+def write_expr(exp: 'expr.LISPExpr', out=None, max_depth=None, max_length=None):
+    """Write the external representation of `exp` to the stream `out`.
+
+    The expression tree is walked with an explicit stack instead of recursion,
+    so arbitrarily deep or long lists can be printed without hitting the
+    recursion limit or building intermediate strings. `out` defaults to
+    `sys.stdout`.
+
+    Optional limits:
+      max_depth  -- lists nested deeper than this are written as (...)
+      max_length -- only the first max_length elements of a list are written,
+                    the rest are elided as ..., so that an elided list with no
+                    elements written, ( ...), differs from one elided by depth
+
+    >>> from parser import lexer, parse_tokens
+    >>> e = parse_tokens(lexer("(1 (2 (3 (4))) 5 6 7)"))[0]
+    >>> write_expr(e)
+    (1 (2 (3 (4))) 5 6 7)
+    >>> write_expr(e, max_depth=2)
+    (1 (2 (...)) 5 6 7)
+    >>> write_expr(e, max_length=3)
+    (1 (2 (3 (4))) 5 ...)
+    >>> write_expr(e, max_length=0)
+    ( ...)
+    >>> write_expr(parse_tokens(lexer("()"))[0])
+    ()
+    >>> deep = parse_tokens(lexer('1'))[0]
+    >>> for _ in range(100000):
+    ...     deep = expr.CombinationExpr([deep])
+    >>> len(repr_expr(deep))
+    200001
+    """
+    if out is None:
+        out = sys.stdout
+    write = out.write
+    stack = [(exp, 0)]
+    while stack:
+        item, depth = stack.pop()
+        if isinstance(item, str):
+            write(item)
+        elif not is_list_expr(item):
+            write(item.repr())
+        elif max_depth is not None and depth >= max_depth:
+            write('(...)')
+        else:
+            subexprs = item.subexprs
+            closer = ')'
+            if max_length is not None and len(subexprs) > max_length:
+                subexprs = subexprs[:max_length]
+                closer = ' ...)'
+            write('(')
+            stack.append((closer, depth))
+            for i in range(len(subexprs) - 1, -1, -1):
+                stack.append((subexprs[i], depth + 1))
+                if i:
+                    stack.append((' ', depth))
+
+def repr_expr(exp: 'expr.LISPExpr', max_depth=None, max_length=None) -> str:
+    """Return the external representation of `exp` as a string.
+
+    >>> from parser import lexer, parse_tokens
+    >>> repr_expr(parse_tokens(lexer("(a (b c) d)"))[0], max_depth=1)
+    '(a (...) d)'
+    """
+    from io import StringIO
+    out = StringIO()
+    write_expr(exp, out, max_depth, max_length)
+    return out.getvalue()
+
+def is_list_expr(exp: 'expr.LISPExpr') -> bool:
+    """Return whether `exp` is printed as a parenthesized list.
+
+    Combination subclasses that define their own `repr` (e.g. builtin
+    procedures) are printed atomically.
+    """
+    return (isinstance(exp, expr.CombinationExpr)
+            and type(exp).repr is expr.CombinationExpr.repr)
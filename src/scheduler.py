@@ -0,0 +1,299 @@
+import asyncio
+import collections
+import threading
+
+import limits
+
+TASK_STACK_SIZE = 64 * 1024 * 1024
+
+class DeadlockError(RuntimeError):
+    """Raised when the top level waits for an event no task can cause."""
+
+
+class Task:
+    """A lightweight Scheme task.
+
+    Every task evaluates on its own host thread, because the evaluator is a
+    plain recursive `eval` that cannot be suspended otherwise. The threads
+    never run concurrently: a task only runs while the scheduler's event loop
+    is waiting for it, and hands control back whenever it parks on an
+    awaitable (a yield, a sleep, a channel receive or a blocking I/O call).
+    """
+
+    def __init__(self, scheduler, thunk):
+        """Create a task that will call `thunk` with no arguments.
+
+        Attributes:
+          done      -- whether the task has finished running
+          result    -- the value returned by `thunk`
+          error     -- the exception raised by `thunk` or None
+          joiners   -- futures of the waiters to wake once the task is done
+        """
+        self.scheduler = scheduler
+        self.thunk = thunk
+        self.done = False
+        self.in_run = False
+        self.result = None
+        self.error = None
+        self.joiners = []
+        self._awaiting = None
+        self._resume_value, self._resume_error = None, None
+        self._resume = threading.Event()
+        self._parked = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        self.scheduler._local.task = self
+        self._resume.wait()
+        try:
+            self.result = self.thunk()
+        except BaseException as e:
+            self.error = e
+        self.done = True
+        self._parked.set()
+
+    def _step(self):
+        """Run the task until it parks or finishes; return what it awaits."""
+        self._parked.clear()
+        self._resume.set()
+        self._parked.wait()
+        return self._awaiting
+
+    def park(self, make_awaitable):
+        """Suspend this task until the awaitable made by `make_awaitable` is
+        done and return its result.
+
+        Must be called from the task's own thread. `make_awaitable` is called
+        on the event loop thread.
+        """
+        self._awaiting = make_awaitable
+        self._resume.clear()
+        self._parked.set()
+        self._resume.wait()
+        if self._resume_error is not None:
+            raise self._resume_error
+        return self._resume_value
+
+    async def _drive(self):
+        while True:
+            make_awaitable = self._step()
+            if self.done:
+                break
+            try:
+                self._resume_value = await make_awaitable()
+                self._resume_error = None
+            except Exception as e:
+                self._resume_value, self._resume_error = None, e
+        self.scheduler.tasks.discard(self)
+        for joiner in self.joiners:
+            self.scheduler.wake(joiner)
+        self.scheduler.check_deadlock()
+
+
+class Scheduler:
+    """A cooperative scheduler for Scheme tasks backed by an asyncio loop.
+
+    Code that is not running inside a task (e.g. the REPL) drives the event
+    loop whenever it has to wait, so spawned tasks make progress while the
+    top level sleeps, receives from a channel or joins a task.
+
+    Waits on events that only another waiter can cause (a channel receive or a
+    join) are tracked until they are resolved: `blocked` maps the future of
+    each such wait made by a task to the task, and `blocked_top` holds the
+    futures the top level waits on. When the top level is blocked that way and
+    so is every live task, nothing can ever wake it up, so it gets a
+    DeadlockError instead of hanging. Since a task waits for one thing at a
+    time, that check only compares counts. Sleeps and blocking I/O calls
+    complete on their own and never count as blocked.
+
+    Tasks are cheap to switch between but not to create: each one is an OS
+    thread with a stack of TASK_STACK_SIZE bytes, so that deep recursion works
+    inside tasks. The stack is reserved address space that is only backed by
+    memory as it is used, but creating a thread costs far more than switching
+    tasks, and the thread limits of the OS bound the number of live tasks to
+    some thousands; `spawn` raises RuntimeError past that.
+
+    >>> import builtin
+    >>> from parser import lexer, parse_tokens
+    >>> from environment import GlobalEnvironment
+    >>> env = GlobalEnvironment()
+    >>> builtin.bind_builtins(env)
+    >>> run = lambda s: parse_tokens(lexer(s))[0].eval(env)
+    >>> run('(define ch (make-channel))')
+    Name('ch')
+    >>> run('(define (worker n) (send ch (+ (receive ch) n)))')
+    Name('worker')
+    >>> spawn = parse_tokens(lexer('(spawn worker 1)'))[0]
+    >>> tasks = [spawn.eval(env) for _ in range(3000)]
+    >>> run('(yield)')
+    UndefinedExpr()
+    >>> len(Scheduler.GLOBAL.blocked)
+    3000
+    >>> run('(send ch 0)')
+    UndefinedExpr()
+    >>> run('(run-tasks)')
+    UndefinedExpr()
+    >>> run('(receive ch)')
+    IntegerLiteral(3000)
+    >>> Scheduler.GLOBAL.blocked, Scheduler.GLOBAL.blocked_top
+    ({}, set())
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.tasks = set()
+        self.blocked = {}
+        self.blocked_top = set()
+        self._local = threading.local()
+
+    def current_task(self):
+        return getattr(self._local, 'task', None)
+
+    def spawn(self, thunk) -> Task:
+        """Schedule `thunk` to run as a new task and return the task.
+
+        Raises RuntimeError if the OS cannot start another thread.
+        """
+        # the stack size applies to threads started while it is set
+        previous = threading.stack_size(TASK_STACK_SIZE)
+        try:
+            task = Task(self, thunk)
+            task._thread.start()
+        finally:
+            threading.stack_size(previous)
+        task.driver = self.loop.create_task(task._drive())
+        self.tasks.add(task)
+        return task
+
+    def wait(self, make_awaitable):
+        """Wait for the awaitable made by `make_awaitable` and return its
+        result, letting other tasks run in the meantime.
+
+        The wait is cut short with a TimeLimitError when the timeout of the
+        current meter runs out.
+        """
+        meter = limits.state.meter
+        remaining = meter.remaining_time()
+        if remaining is None:
+            make_bounded = make_awaitable
+        else:
+            make_bounded = lambda: asyncio.wait_for(make_awaitable(), remaining)
+        task = self.current_task()
+        try:
+            if task is not None:
+                return task.park(make_bounded)
+            return self.loop.run_until_complete(make_bounded())
+        except asyncio.TimeoutError:
+            if remaining is None:
+                raise
+            raise meter.time_limit_error()
+
+    def wait_event(self, register):
+        """Wait until another waiter wakes us and return the value it passes.
+
+        `register` is called with a fresh future that the waker passes to
+        `wake`.
+        """
+        future = self.loop.create_future()
+        register(future)
+        task = self.current_task()
+        if task is None:
+            self.blocked_top.add(future)
+        else:
+            self.blocked[future] = task
+        # a future cancelled by a timeout is never passed to `wake`
+        future.add_done_callback(self.unblock)
+        async def until_woken():
+            self.check_deadlock()
+            return await future
+        try:
+            return self.wait(until_woken)
+        finally:
+            self.unblock(future)
+
+    def unblock(self, future):
+        """Stop counting the waiter of `future` as blocked."""
+        self.blocked.pop(future, None)
+        self.blocked_top.discard(future)
+
+    def wake(self, future, value=None):
+        """Resolve the `future` of a waiter blocked in `wait_event`."""
+        self.unblock(future)
+        if not future.done():
+            future.set_result(value)
+
+    def check_deadlock(self):
+        """Fail the top level's wait if no one is left who could wake it."""
+        if not self.blocked_top or len(self.blocked) < len(self.tasks):
+            return
+        for future in list(self.blocked_top):
+            self.unblock(future)
+            if not future.done():
+                future.set_exception(
+                    DeadlockError('waiting for an event no task can cause'))
+
+    def yield_(self):
+        self.wait(lambda: asyncio.sleep(0))
+
+    def sleep(self, seconds):
+        self.wait(lambda: asyncio.sleep(seconds))
+
+    def join(self, task):
+        """Wait for `task` to finish and return its result or raise its error."""
+        if not task.done:
+            self.wait_event(task.joiners.append)
+        if task.error is not None:
+            raise task.error
+        return task.result
+
+    def blocking(self, func, *args):
+        """Run the blocking call `func(*args)` off the loop and return its
+        result, parking only the calling task."""
+        return self.wait(lambda: self.loop.run_in_executor(None, func, *args))
+
+    def run(self):
+        """Run until every spawned task has finished.
+
+        Called from a task, wait for every other task except those that are
+        themselves waiting in `run`, which would otherwise wait for each other.
+        """
+        current = self.current_task()
+        if current is not None:
+            current.in_run = True
+        try:
+            while True:
+                pending = [t for t in self.tasks
+                           if not t.done and t is not current and not t.in_run]
+                if not pending:
+                    return
+                for task in pending:
+                    if not task.done and not task.in_run:
+                        self.wait_event(task.joiners.append)
+        finally:
+            if current is not None:
+                current.in_run = False
+
+
+class Channel:
+    """An unbounded FIFO channel for passing messages between tasks."""
+
+    def __init__(self, scheduler):
+        self.scheduler = scheduler
+        self.values = collections.deque()
+        self.receivers = collections.deque()
+
+    def send(self, value):
+        while self.receivers:
+            receiver = self.receivers.popleft()
+            if not receiver.done():
+                self.scheduler.wake(receiver, value)
+                return
+        self.values.append(value)
+
+    def receive(self):
+        if self.values:
+            return self.values.popleft()
+        return self.scheduler.wait_event(self.receivers.append)
+
+
+Scheduler.GLOBAL = Scheduler()
@@ -0,0 +1,214 @@
+from typing import List
+
+import expr
+
+TIER_UP_THRESHOLD = 100
+
+class Unsupported(Exception):
+    """Raised when a lambda uses a form the transpiler cannot translate."""
+
+
+class NativeProcedure:
+    """A lambda translated to a Python function.
+
+    Attributes:
+      function -- the compiled Python function over exact host numbers
+      nargs    -- the number of formal parameters
+      guards   -- (cell, version) pairs of the global cells the free names in
+                  the lambda body resolved to and their versions when it was
+                  compiled
+    """
+
+    def __init__(self, function, nargs, guards):
+        self.function = function
+        self.nargs = nargs
+        self.guards = guards
+
+    def guards_hold(self) -> bool:
+        for cell, version in self.guards:
+            if cell.version != version:
+                return False
+        return True
+
+
+UNSUPPORTED = object()
+
+def call_native(lam: 'expr.LambdaExpr', args: List['expr.LISPExpr']):
+    """Call the native translation of `lam` on `args`, compiling it first if
+    needed.
+
+    Return None when the call has to be handled by the interpreter: when the
+    lambda cannot be translated, a global it depends on has been redefined, or
+    the arguments are not integers.
+    """
+    native = lam.native
+    if native is None:
+        try:
+            native = compile_lambda(lam)
+        except Unsupported:
+            native = UNSUPPORTED
+        lam.native = native
+    if native is UNSUPPORTED:
+        return None
+    if not native.guards_hold():
+        lam.native, lam.call_count = None, 0
+        return None
+    if len(args) != native.nargs:
+        return None
+    for arg in args:
+        if type(arg) is not expr.IntegerLiteral:
+            return None
+    result = native.function(*[arg.host_value for arg in args])
+    if result is True or result is False:
+        return expr.BooleanLiteral('#t' if result else '#f')
+    return expr.NumericLiteral.create_numeric_literal(result)
+
+def compile_lambda(lam: 'expr.LambdaExpr') -> NativeProcedure:
+    """Translate `lam` to a Python function.
+
+    Supported bodies are built from integer and boolean literals, the formal
+    parameters, `if`, calls to the arithmetic builtins and calls to the
+    lambda itself. Self calls in tail position become loops.
+
+    >>> import builtin
+    >>> from parser import lexer, parse_tokens
+    >>> from environment import Environment
+    >>> builtin.bind_builtins(Environment.GLOBAL)
+    >>> run = lambda s: parse_tokens(lexer(s))[0].eval(Environment.GLOBAL)
+    >>> run('(define (count n acc) (if (= n 0) acc (count (- n 1) (+ acc 1))))')
+    Name('count')
+    >>> print(compile_lambda(run('count')).source)
+    def native(a0, a1):
+        while True:
+            if (a0 == 0) is not False:
+                return a1
+            else:
+                a0, a1 = (a0 - 1), (a1 + 1)
+                continue
+    >>> run('(count 100000 0)')
+    IntegerLiteral(100000)
+    >>> run('(define (fib n) (if (< n 2) n (+ (fib (- n 1)) (fib (- n 2)))))')
+    Name('fib')
+    >>> run('(fib 20)')
+    IntegerLiteral(6765)
+    >>> run('fib').native.function(25)
+    75025
+    >>> compile_lambda(run('(lambda (x) (display x))'))
+    Traceback (most recent call last):
+    ...
+    transpiler.Unsupported: display is not supported
+    """
+    params = {}
+    for i, formal in enumerate(lam.args.subexprs):
+        if not isinstance(formal, expr.Name):
+            raise Unsupported('non-name formal parameter')
+        params[formal._str] = 'a{}'.format(i)
+    translator = Translator(lam, params)
+    signature = ', '.join(params.values())
+    lines = ['def native({}):'.format(signature), '    while True:']
+    lines += translator.statement(lam.body, 2)
+    source = '\n'.join(lines)
+    import builtin
+    namespace = {'_div': builtin.divide}
+    exec(compile(source, '<lambda>', 'exec'), namespace)
+    native = NativeProcedure(namespace['native'], len(params),
+                             list(translator.guards.values()))
+    native.source = source
+    return native
+
+
+class Translator:
+    """Translate the body of a lambda to Python source lines."""
+
+    OPERATORS = {'+': ' + ', '-': ' - ', '*': ' * '}
+    COMPARISONS = {'=': ' == ', '<': ' < ', '>': ' > ', '<=': ' <= ',
+                   '>=': ' >= '}
+
+    def __init__(self, lam, params):
+        self.lam = lam
+        self.params = params
+        self.guards = {}
+
+    def resolve(self, name: 'expr.Name'):
+        """Return the global value the free `name` refers to and guard on it."""
+        cell = self.lam.closure.global_cell(name._str)
+        if cell is None:
+            raise Unsupported(name._str + ' is not a global name')
+        self.guards[name._str] = (cell, cell.version)
+        return cell.value
+
+    def statement(self, exp, depth) -> List[str]:
+        indent = '    ' * depth
+        if isinstance(exp, expr.CombinationExpr):
+            form = exp.sift()
+            if isinstance(form, expr.IfExpr):
+                return ([indent + 'if {} is not False:'.format(
+                            self.expression(form.predicate))]
+                        + self.statement(form.consequent, depth + 1)
+                        + [indent + 'else:']
+                        + self.statement(form.alternative, depth + 1))
+            if self.is_self_call(form):
+                operands = [self.expression(e) for e in form[1:]]
+                if len(operands) != len(self.params):
+                    raise Unsupported('arity mismatch in self call')
+                return [indent + '{} = {}'.format(', '.join(self.params.values()),
+                                                  ', '.join(operands)),
+                        indent + 'continue']
+        return [indent + 'return ' + self.expression(exp)]
+
+    def expression(self, exp) -> str:
+        if type(exp) is expr.IntegerLiteral:
+            return repr(exp.host_value)
+        if isinstance(exp, expr.BooleanLiteral):
+            return repr(exp.host_value)
+        if isinstance(exp, expr.Name):
+            if exp._str in self.params:
+                return self.params[exp._str]
+            raise Unsupported('free name ' + exp._str)
+        if not isinstance(exp, expr.CombinationExpr) or not exp.subexprs:
+            raise Unsupported(type(exp).__name__ + ' is not supported')
+        form = exp.sift()
+        if isinstance(form, expr.IfExpr):
+            return '({} if {} is not False else {})'.format(
+                self.expression(form.consequent),
+                self.expression(form.predicate),
+                self.expression(form.alternative))
+        if not isinstance(form, expr.CallExpr):
+            raise Unsupported(form[0].repr() + ' is not supported')
+        operands = [self.expression(e) for e in form[1:]]
+        if self.is_self_call(form):
+            if len(operands) != len(self.params):
+                raise Unsupported('arity mismatch in self call')
+            return 'native({})'.format(', '.join(operands))
+        return self.builtin_call(form[0], operands)
+
+    def builtin_call(self, operator, operands) -> str:
+        if not isinstance(operator, expr.Name) or operator._str in self.params:
+            raise Unsupported('unsupported operator')
+        procedure = self.resolve(operator)
+        if not isinstance(procedure, expr.BuiltinProcedure):
+            raise Unsupported(operator._str + ' is not supported')
+        name = procedure.default_name._str
+        if name == '/':
+            return '_div({})'.format(', '.join(operands))
+        if name in self.COMPARISONS:
+            if len(operands) < 2:
+                raise Unsupported('wrong number of operands for ' + name)
+            return '(' + self.COMPARISONS[name].join(operands) + ')'
+        if name not in self.OPERATORS:
+            raise Unsupported(operator._str + ' is not supported')
+        if not operands:
+            if name == '-':
+                raise Unsupported('no operands for -')
+            return '0' if name == '+' else '1'
+        if len(operands) == 1 and name == '-':
+            return '(-{})'.format(operands[0])
+        return '(' + self.OPERATORS[name].join(operands) + ')'
+
+    def is_self_call(self, form) -> bool:
+        if not isinstance(form, expr.CallExpr):
+            return False
+        operator = form[0]
+        if not isinstance(operator, expr.Name) or operator._str in self.params:
+            return False
+        return self.resolve(operator) is self.lam